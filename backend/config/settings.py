@@ -1,8 +1,9 @@
 """
 配置管理模块
 """
-from pydantic_settings import BaseSettings
-from typing import Optional
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from functools import lru_cache
+from typing import List, Optional
 import os
 
 class Settings(BaseSettings):
@@ -15,6 +16,13 @@ class Settings(BaseSettings):
     backup_dir: str = "./data/backups"
     upload_dir: str = "./uploads"
     
+    # 元数据缓存（相同小说重复上传时跳过Claude调用）
+    metadata_cache_path: str = "./data/metadata_cache.db"
+    metadata_cache_ttl: int = 7 * 24 * 3600
+    
+    # 同时进行的Claude请求上限
+    claude_max_concurrency: int = 5
+    
     # 发布配置
     publish_endpoint: str = "https://wxrd.alongmen.com/book/v1/uploadBookInfo"
     publish_secret: str = "aiGenerateBook"
@@ -22,12 +30,20 @@ class Settings(BaseSettings):
     # 日志配置
     log_level: str = "INFO"
     
-    class Config:
-        env_file = ".env"
-        case_sensitive = False
+    # CORS配置（显式列出允许的来源，局域网访问时通过环境变量追加）
+    cors_origins: List[str] = [
+        "http://localhost:3838",
+        "http://127.0.0.1:3838",
+        "http://localhost:8038",
+        "http://127.0.0.1:8038",
+    ]
+    
+    model_config = SettingsConfigDict(env_file=".env", case_sensitive=False, extra="ignore")
 
-# 创建全局配置实例
-settings = Settings()
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """获取全局配置实例（首次调用时读取环境变量，测试中可通过cache_clear()重置）"""
+    return Settings()
 
 # 分类映射配置
 CATEGORY_MAPPING = {
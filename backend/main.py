@@ -3,75 +3,171 @@ FastAPI主应用入口
 """
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, FileResponse
 from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
 import uvicorn
+import httpx
+import orjson
+import asyncio
 import logging
+import re
+import sys
 from datetime import datetime
 from pathlib import Path
+from weakref import WeakValueDictionary
 
 from routers import novel_router
 from routers import text_strip
-from config.settings import settings
+from services import ClaudeService, MetadataCache
+from config.settings import get_settings
 
-# 配置日志
-logging.basicConfig(
-    level=getattr(logging, settings.log_level),
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
 # 创建FastAPI应用
 app = FastAPI(
     title="小说发布结构化系统",
     description="将Markdown格式的小说文件结构化为发布格式，支持AI生成元数据",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
-# CORS配置
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # 生产环境应该设置具体的域名
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# 中间件约定：自定义中间件一律写成纯ASGI类（实现 async __call__(scope, receive, send)
+# 并直接调用 self.app(scope, receive, send)），不要继承 BaseHTTPMiddleware，
+# 后者会为每个请求额外创建任务组，显著降低吞吐。
+
+class SettingsCORSMiddleware:
+    """
+    CORS配置：来源列表在应用收到第一个ASGI事件（启动时的lifespan）时读取配置，
+    而不是在模块导入时读取
+    
+    使用显式来源列表而不是通配符，预检响应头由CORSMiddleware在创建时一次性构建
+    """
+    
+    def __init__(self, app):
+        self.app = app
+        self.cors = None
+    
+    async def __call__(self, scope, receive, send):
+        if self.cors is None:
+            self.cors = CORSMiddleware(
+                self.app,
+                allow_origins=get_settings().cors_origins,
+                allow_credentials=True,
+                allow_methods=["*"],
+                allow_headers=["*"],
+            )
+        await self.cors(scope, receive, send)
+
+app.add_middleware(SettingsCORSMiddleware)
+
+class EventStreamAwareGZipMiddleware:
+    """
+    响应压缩，但text/event-stream响应原样发送
+    
+    GZipMiddleware会把SSE的各条消息攒进压缩缓冲区，直到流结束才一次性发出，
+    客户端收不到逐条推送。这里在响应头到达时判断类型，事件流绕过压缩直接发送
+    """
+    
+    def __init__(self, app, minimum_size: int = 500, compresslevel: int = 9):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compresslevel = compresslevel
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        async def dispatch(scope, receive, gzip_send):
+            passthrough = False
+            
+            async def send_wrapper(message):
+                nonlocal passthrough
+                if message["type"] == "http.response.start":
+                    content_type = Headers(raw=message["headers"]).get("content-type", "")
+                    passthrough = content_type.startswith("text/event-stream")
+                await (send if passthrough else gzip_send)(message)
+            
+            await self.app(scope, receive, send_wrapper)
+        
+        gzip = GZipMiddleware(dispatch, minimum_size=self.minimum_size, compresslevel=self.compresslevel)
+        await gzip(scope, receive, send)
+
+# 响应压缩（解析结果和导出内容可达数MB，小于1KB的响应不压缩；SSE流不压缩）
+app.add_middleware(EventStreamAwareGZipMiddleware, minimum_size=1024, compresslevel=5)
 
 # 注册路由
 app.include_router(novel_router)
 app.include_router(text_strip.router)
 
+class CachedStaticFiles(StaticFiles):
+    """为静态文件添加缓存头：带内容哈希的资源长期缓存，其余文件每次协商缓存"""
+    
+    # 匹配构建工具生成的哈希文件名，如 index-BxT3kz9a.js（哈希段需含数字，避免误判普通单词）
+    HASHED_ASSET_RE = re.compile(r'[.-](?=[A-Za-z_-]*\d)[A-Za-z0-9_-]{8,}\.(?:js|css|woff2?|png|jpe?g|svg|webp)$')
+    
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if self.HASHED_ASSET_RE.search(Path(full_path).name):
+            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        else:
+            response.headers["Cache-Control"] = "public, max-age=0, must-revalidate"
+        return response
+
 # 挂载静态文件目录
 static_path = Path(__file__).parent / "static"
 if static_path.exists():
-    app.mount("/static", StaticFiles(directory=str(static_path)), name="static")
+    app.mount("/static", CachedStaticFiles(directory=str(static_path)), name="static")
 
 # WebSocket连接管理
 class ConnectionManager:
     def __init__(self):
-        self.active_connections: dict = {}
+        # 弱引用字典：连接关闭后即使未调用disconnect，WebSocket对象也能被回收
+        self.active_connections: WeakValueDictionary = WeakValueDictionary()
     
     async def connect(self, websocket: WebSocket, client_id: str):
         await websocket.accept()
         self.active_connections[client_id] = websocket
-        logger.info(f"WebSocket连接建立: {client_id}")
+        logger.info("WebSocket连接建立: %s", client_id)
     
     def disconnect(self, client_id: str):
-        if client_id in self.active_connections:
-            del self.active_connections[client_id]
-            logger.info(f"WebSocket连接断开: {client_id}")
+        if self.active_connections.pop(client_id, None) is not None:
+            logger.info("WebSocket连接断开: %s", client_id)
     
-    async def send_message(self, message: str, client_id: str):
-        if client_id in self.active_connections:
-            websocket = self.active_connections[client_id]
-            await websocket.send_text(message)
+    async def send_json(self, obj: dict, client_id: str):
+        """以JSON格式发送消息（orjson一次编码，直接发送二进制帧）"""
+        websocket = self.active_connections.get(client_id)
+        if websocket is not None:
+            await websocket.send_bytes(orjson.dumps(obj))
     
     async def broadcast(self, message: str):
-        for client_id, websocket in self.active_connections.items():
-            await websocket.send_text(message)
+        # 先取快照，避免并发断开时字典在迭代中被修改
+        connections = list(self.active_connections.items())
+        results = await asyncio.gather(
+            *(websocket.send_text(message) for _, websocket in connections),
+            return_exceptions=True
+        )
+        # 发送失败的连接视为已断开
+        for (client_id, _), result in zip(connections, results):
+            if isinstance(result, Exception):
+                logger.warning("广播失败，移除连接 %s: %s", client_id, result)
+                self.disconnect(client_id)
 
 manager = ConnectionManager()
 
+# WebSocket连接数日志间隔（秒），用于及早发现连接泄漏
+CONNECTION_LOG_INTERVAL = 300
+
+async def log_connection_count():
+    """定期记录活跃WebSocket连接数"""
+    while True:
+        await asyncio.sleep(CONNECTION_LOG_INTERVAL)
+        logger.info("活跃WebSocket连接数: %s", len(manager.active_connections))
+
 @app.get("/")
 async def root():
     """根路径 - 返回HTML界面"""
@@ -106,7 +202,7 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str):
         while True:
             # 接收客户端消息
             data = await websocket.receive_text()
-            logger.info(f"收到消息 from {client_id}: {data}")
+            logger.info("收到消息 from %s: %s", client_id, data)
             
             # 处理消息并返回
             response = {
@@ -115,23 +211,34 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str):
                 "timestamp": datetime.now().isoformat()
             }
             
-            await manager.send_message(str(response), client_id)
+            await manager.send_json(response, client_id)
             
     except WebSocketDisconnect:
-        manager.disconnect(client_id)
-        logger.info(f"客户端断开连接: {client_id}")
+        logger.info("客户端断开连接: %s", client_id)
     except Exception as e:
-        logger.error(f"WebSocket错误: {e}")
+        logger.error("WebSocket错误: %s", e)
+    finally:
+        # 无论何种方式退出都回收连接槽位
         manager.disconnect(client_id)
 
 @app.on_event("startup")
 async def startup_event():
     """应用启动事件"""
+    settings = get_settings()
+    
+    # 配置日志
+    logging.basicConfig(
+        level=getattr(logging, settings.log_level),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    
     logger.info("=" * 50)
     logger.info("小说发布结构化系统启动")
     logger.info(f"版本: 1.0.0")
-    logger.info(f"端口: {settings.port}")
-    logger.info(f"环境: {'开发' if settings.anthropic_api_key == 'your_api_key_here' else '生产'}")
+    logger.info("端口: %s", settings.port)
+    # 记录事件循环实现，便于发现uvloop未生效时的静默回退
+    logger.info("事件循环: %s", asyncio.get_running_loop().__class__.__module__)
+    logger.info("环境: %s", '开发' if settings.anthropic_api_key == 'your_api_key_here' else '生产')
     
     # 确保必要的目录存在
     paths = [
@@ -142,19 +249,46 @@ async def startup_event():
     
     for path in paths:
         path.mkdir(parents=True, exist_ok=True)
-        logger.info(f"确保目录存在: {path}")
+        logger.info("确保目录存在: %s", path)
+    
+    # 接口响应缓存（进程内）
+    FastAPICache.init(InMemoryBackend())
+    
+    # 共享的出站HTTP客户端，跨请求复用TCP连接和TLS会话
+    app.state.http_client = httpx.AsyncClient(
+        timeout=30.0,
+        limits=httpx.Limits(max_keepalive_connections=50, max_connections=100),
+        http2=True
+    )
+    
+    app.state.connection_log_task = asyncio.create_task(log_connection_count())
+    
+    # 全局Claude服务实例（未配置API密钥时为None）
+    if settings.anthropic_api_key and settings.anthropic_api_key != "your_api_key_here":
+        app.state.claude_service = ClaudeService(
+            api_key=settings.anthropic_api_key,
+            cache=MetadataCache(settings.metadata_cache_path, settings.metadata_cache_ttl),
+            max_concurrency=settings.claude_max_concurrency
+        )
+    else:
+        app.state.claude_service = None
+        logger.warning("未配置Anthropic API密钥，将使用默认元数据")
     
     logger.info("=" * 50)
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """应用关闭事件"""
+    app.state.connection_log_task.cancel()
+    await app.state.http_client.aclose()
+    await ClaudeService.close()
+    text_strip.shutdown_process_pool()
     logger.info("小说发布结构化系统关闭")
 
 @app.exception_handler(404)
 async def not_found_handler(request, exc):
     """404错误处理"""
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=404,
         content={
             "error": "Not Found",
@@ -166,8 +300,8 @@ async def not_found_handler(request, exc):
 @app.exception_handler(500)
 async def internal_error_handler(request, exc):
     """500错误处理"""
-    logger.error(f"内部错误: {exc}")
-    return JSONResponse(
+    logger.error("内部错误: %s", exc)
+    return ORJSONResponse(
         status_code=500,
         content={
             "error": "Internal Server Error",
@@ -178,10 +312,13 @@ async def internal_error_handler(request, exc):
 
 if __name__ == "__main__":
     # 直接运行时启动服务器
+    settings = get_settings()
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=settings.port,
         reload=True,
+        loop="asyncio" if sys.platform == "win32" else "uvloop",  # uvloop不支持Windows
+        http="httptools",
         log_level=settings.log_level.lower()
     )
\ No newline at end of file
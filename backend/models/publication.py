@@ -1,18 +1,22 @@
 """
 数据模型定义
 """
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Optional
 from datetime import datetime
 
 class Chapter(BaseModel):
     """章节模型"""
+    model_config = ConfigDict(defer_build=True)
+    
     chapterTitle: str = Field(..., description="章节标题")
     content: str = Field(..., description="章节内容")
     seq: Optional[int] = Field(None, description="章节相对顺序")
 
 class Metadata(BaseModel):
     """元数据模型"""
+    model_config = ConfigDict(defer_build=True)
+    
     sourceFile: str = Field(..., description="源文件路径")
     parseTime: datetime = Field(default_factory=datetime.now, description="解析时间")
     wordCount: int = Field(..., description="总字数")
@@ -20,6 +24,8 @@ class Metadata(BaseModel):
 
 class PublicationData(BaseModel):
     """发布数据模型"""
+    model_config = ConfigDict(defer_build=True)
+    
     # 基础信息
     title: str = Field(..., description="作品标题（从第3行提取）")
     intro: str = Field(..., description="作品简介（Claude生成）")
@@ -43,27 +49,38 @@ class PublicationData(BaseModel):
 
 class ParseOptions(BaseModel):
     """解析选项"""
+    model_config = ConfigDict(defer_build=True)
+    
     generateIntro: bool = Field(default=True, description="生成简介")
     generateAwesomeParagraph: bool = Field(default=True, description="生成精彩片段")
     autoCategories: bool = Field(default=True, description="自动分类")
+    forceRefresh: bool = Field(default=False, description="忽略缓存重新生成元数据")
 
 class ParseRequest(BaseModel):
     """解析请求"""
+    model_config = ConfigDict(defer_build=True)
+    
     filePath: str = Field(..., description="文件路径")
     options: Optional[ParseOptions] = Field(default_factory=ParseOptions)
 
 class UpdateRequest(BaseModel):
     """更新请求"""
+    model_config = ConfigDict(defer_build=True)
+    
     filePath: str = Field(..., description="文件路径")
     data: PublicationData = Field(..., description="更新的数据")
 
 class GenerateRequest(BaseModel):
     """生成请求"""
+    model_config = ConfigDict(defer_build=True)
+    
     chapters: List[Chapter] = Field(..., description="章节列表")
     minLength: int = Field(default=400, description="最小长度")
     maxLength: int = Field(default=1000, description="最大长度")
 
 class PublishRequest(BaseModel):
     """发布请求"""
+    model_config = ConfigDict(defer_build=True)
+    
     data: PublicationData = Field(..., description="发布数据")
     platform: str = Field(default="wechat", description="发布平台")
\ No newline at end of file
@@ -1,10 +1,15 @@
 """
 小说处理相关路由
 """
-from fastapi import APIRouter, HTTPException, UploadFile, File
-from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, UploadFile, File
+from fastapi_cache import FastAPICache
+from fastapi.responses import Response, StreamingResponse
+from fastapi_cache.decorator import cache
+from typing import AsyncIterator, Optional
 import httpx
+import orjson
 import hashlib
+import functools
 from datetime import datetime
 import logging
 import aiofiles
@@ -16,13 +21,12 @@ from models.publication import (
     UpdateRequest,
     GenerateRequest,
     PublishRequest,
-    Chapter
+    Chapter,
+    Metadata
 )
-from services import NovelParser, ClaudeService, FileManager
-from config.settings import settings
+from services import NovelParser, ClaudeService, FileManager, dump_publication
+from config.settings import Settings, get_settings
 
-# 配置日志
-logging.basicConfig(level=getattr(logging, settings.log_level))
 logger = logging.getLogger(__name__)
 
 # 创建路由器
@@ -31,8 +35,28 @@ router = APIRouter(prefix="/api/novel", tags=["novel"])
 # 初始化服务
 file_manager = FileManager()
 
+# 文件列表缓存的命名空间和过期时间（秒）
+NOVEL_LIST_CACHE_NAMESPACE = "novels"
+NOVEL_LIST_CACHE_EXPIRE = 5
+
+@functools.lru_cache(maxsize=2)
+def _daily_signature(date_str: str, secret: str) -> str:
+    """计算发布签名（按日期缓存，日期变化时自动失效）"""
+    return hashlib.md5(f"{date_str}{secret}".encode()).hexdigest()
+
+def get_claude_service(request: Request) -> Optional[ClaudeService]:
+    """获取应用启动时创建的Claude服务（未配置API密钥时为None）"""
+    return request.app.state.claude_service
+
+def get_http_client(request: Request) -> httpx.AsyncClient:
+    """获取应用级共享的HTTP客户端"""
+    return request.app.state.http_client
+
 @router.post("/parse", response_model=PublicationData)
-async def parse_novel(request: ParseRequest):
+async def parse_novel(
+    request: ParseRequest,
+    claude: Optional[ClaudeService] = Depends(get_claude_service)
+):
     """
     解析小说文件并生成结构化数据
     
@@ -51,7 +75,7 @@ async def parse_novel(request: ParseRequest):
         logger.info(f"文件解析成功，共{raw_data['stats']['chapterCount']}章")
         
         # 检查是否有API密钥
-        if not settings.anthropic_api_key or settings.anthropic_api_key == "your_api_key_here":
+        if claude is None:
             logger.warning("未配置Anthropic API密钥，使用默认值")
             # 使用默认值
             metadata = {
@@ -64,38 +88,43 @@ async def parse_novel(request: ParseRequest):
                 "coverPrompt": None
             }
         else:
-            # 初始化Claude服务
-            claude = ClaudeService(api_key=settings.anthropic_api_key)
-            
             # 一次性生成所有元数据（优化API调用）
             logger.info("开始生成元数据...")
             metadata = await claude.generate_all_metadata(
                 raw_data["title"],
-                raw_data["chapters"]
+                raw_data["chapters"],
+                force_refresh=request.options.forceRefresh if request.options else False
             )
             logger.info("元数据生成成功")
         
-        # 构建完整的发布数据
-        publication_data = {
-            "title": raw_data["title"],
-            "intro": metadata["intro"],
-            "author": metadata["author"],
-            "firstCategory": metadata["firstCategory"],
-            "secondCategory": metadata["secondCategory"],
-            "thirdCategory": metadata["thirdCategory"],
-            "awesomeParagraph": metadata["awesomeParagraph"],
-            "coverPrompt": metadata.get("coverPrompt"),
-            "completeStatus": 2,
-            "chapterList": [Chapter(**{**ch, "seq": idx + 1}) for idx, ch in enumerate(raw_data["chapters"])],
-            "metadata": {
-                "sourceFile": request.filePath,
-                "wordCount": raw_data["stats"]["wordCount"],
-                "chapterCount": raw_data["stats"]["chapterCount"],
-                "parseTime": datetime.now()
-            }
-        }
+        # 构建完整的发布数据（所有字段均为内部计算结果，无需再次校验）
+        meta = Metadata.model_construct(
+            sourceFile=request.filePath,
+            wordCount=raw_data["stats"]["wordCount"],
+            chapterCount=raw_data["stats"]["chapterCount"],
+            parseTime=datetime.now()
+        )
+        
+        publication = PublicationData.model_construct(
+            title=raw_data["title"],
+            intro=metadata["intro"],
+            author=metadata["author"],
+            firstCategory=metadata["firstCategory"],
+            secondCategory=metadata["secondCategory"],
+            thirdCategory=metadata["thirdCategory"],
+            awesomeParagraph=metadata["awesomeParagraph"],
+            coverPrompt=metadata.get("coverPrompt"),
+            completeStatus=2,
+            # 章节数据由解析器内部生成，跳过逐章校验
+            chapterList=[
+                Chapter.model_construct(chapterTitle=ch["chapterTitle"], content=ch["content"], seq=idx + 1)
+                for idx, ch in enumerate(raw_data["chapters"])
+            ],
+            metadata=meta
+        )
         
-        return PublicationData(**publication_data)
+        # 直接返回orjson编码结果，跳过response_model的再次校验和序列化
+        return Response(content=dump_publication(publication), media_type="application/json")
         
     except FileNotFoundError:
         logger.error(f"文件不存在: {request.filePath}")
@@ -118,13 +147,17 @@ async def update_novel(request: UpdateRequest):
     try:
         logger.info(f"更新文件: {request.filePath}")
         await file_manager.save_novel_file(request.filePath, request.data)
+        await FastAPICache.clear(namespace=NOVEL_LIST_CACHE_NAMESPACE)
         return {"success": True, "message": "文件已更新"}
     except Exception as e:
         logger.error(f"更新失败: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/generate-paragraph")
-async def generate_paragraph(request: GenerateRequest):
+async def generate_paragraph(
+    request: GenerateRequest,
+    claude: Optional[ClaudeService] = Depends(get_claude_service)
+):
     """
     生成精彩片段
     
@@ -135,20 +168,17 @@ async def generate_paragraph(request: GenerateRequest):
         精彩片段
     """
     try:
-        if not settings.anthropic_api_key or settings.anthropic_api_key == "your_api_key_here":
+        if claude is None:
             # 从原文提取
-            content = ""
-            for ch in request.chapters[:3]:
-                content += ch.content[:request.minLength // 3]
+            content = "".join(ch.content[:request.minLength // 3] for ch in request.chapters[:3])
             return {"awesomeParagraph": content[:request.maxLength]}
         
-        claude = ClaudeService(api_key=settings.anthropic_api_key)
         chapters_dict = [ch.dict() for ch in request.chapters]
         paragraph = await claude.generate_awesome_paragraph(chapters_dict)
         
         # 确保字数在要求范围内
         if len(paragraph) < request.minLength:
-            paragraph = paragraph + " " * (request.minLength - len(paragraph))
+            paragraph = paragraph.ljust(request.minLength)
         elif len(paragraph) > request.maxLength:
             paragraph = paragraph[:request.maxLength]
         
@@ -157,8 +187,53 @@ async def generate_paragraph(request: GenerateRequest):
         logger.error(f"生成失败: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def _sse_event(data: dict, event: Optional[str] = None) -> bytes:
+    """编码一条Server-Sent Events消息"""
+    head = f"event: {event}\n".encode() if event else b""
+    return head + b"data: " + orjson.dumps(data) + b"\n\n"
+
+@router.post("/generate-paragraph/stream")
+async def stream_paragraph(
+    request: GenerateRequest,
+    claude: Optional[ClaudeService] = Depends(get_claude_service)
+):
+    """
+    流式生成精彩片段（SSE）
+    
+    生成过程中逐条推送 {"delta": ...}，结束时推送 done 事件，
+    携带经过长度检查的最终结果 {"awesomeParagraph": ...}
+    
+    Args:
+        request: 生成请求，包含章节列表和长度要求
+    """
+    chapters_dict = [ch.dict() for ch in request.chapters]
+    
+    async def events() -> AsyncIterator[bytes]:
+        if claude is None:
+            content = "".join(ch.content[:request.minLength // 3] for ch in request.chapters[:3])
+            yield _sse_event({"awesomeParagraph": content[:request.maxLength]}, "done")
+            return
+        
+        chunks = []
+        try:
+            async for text in claude.stream_awesome_paragraph(chapters_dict):
+                chunks.append(text)
+                yield _sse_event({"delta": text})
+            paragraph = claude.finalize_awesome_paragraph("".join(chunks))
+        except Exception as e:
+            logger.error("流式生成失败: %s", e)
+            paragraph = await claude.fallback_awesome_paragraph(chapters_dict)
+        
+        yield _sse_event({"awesomeParagraph": paragraph[:request.maxLength]}, "done")
+    
+    return StreamingResponse(events(), media_type="text/event-stream")
+
 @router.post("/publish")
-async def publish_novel(request: PublishRequest):
+async def publish_novel(
+    request: PublishRequest,
+    client: httpx.AsyncClient = Depends(get_http_client),
+    settings: Settings = Depends(get_settings)
+):
     """
     发布到指定平台
     
@@ -172,37 +247,29 @@ async def publish_novel(request: PublishRequest):
         logger.info(f"开始发布到平台: {request.platform}")
         
         # 生成签名
-        date = datetime.now().strftime("%Y%m%d")
-        signature = hashlib.md5(f"{date}{settings.publish_secret}".encode()).hexdigest()
+        signature = _daily_signature(datetime.now().strftime("%Y%m%d"), settings.publish_secret)
         
-        # 准备发布数据（排除metadata）
-        publish_data = request.data.dict(exclude={"metadata"})
+        # 准备发布数据（排除metadata，章节单独构建避免复制整份章节内容）
+        publish_data = request.data.model_dump(mode="json", exclude={"metadata", "chapterList"})
         
         # 添加cover字段（如果没有则使用空字符串）
         if 'cover' not in publish_data:
             publish_data['cover'] = ""  # 这里可以后续集成图片生成服务
         
-        # 处理章节数据格式
-        formatted_chapters = []
-        for index, chapter in enumerate(publish_data['chapterList']):
-            formatted_chapter = {
-                'chapterTitle': chapter.get('chapterTitle', ''),
-                'content': chapter.get('content', ''),  # 使用content字段
-                'seq': index + 1  # 章节相对顺序，从1开始
-            }
-            formatted_chapters.append(formatted_chapter)
-        
-        publish_data['chapterList'] = formatted_chapters
+        # 处理章节数据格式（seq为章节相对顺序，从1开始）
+        publish_data['chapterList'] = [
+            {"chapterTitle": chapter.chapterTitle, "content": chapter.content, "seq": index + 1}
+            for index, chapter in enumerate(request.data.chapterList)
+        ]
         
         logger.info(f"发布数据: 标题={publish_data['title']}, 章节数={len(publish_data['chapterList'])}")
         
-        # 发送请求
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                settings.publish_endpoint,
-                json=publish_data,
-                headers={"X-Signature": signature}
-            )
+        # 发送请求（复用共享连接池）
+        response = await client.post(
+            settings.publish_endpoint,
+            json=publish_data,
+            headers={"X-Signature": signature}
+        )
         
         logger.info(f"发布响应: status={response.status_code}")
         
@@ -243,23 +310,23 @@ async def upload_novel(file: UploadFile = File(...)):
         if not file.filename.endswith('.md'):
             raise HTTPException(status_code=400, detail="只支持Markdown文件(.md)")
         
-        # 读取文件内容
-        content = await file.read()
-        
-        # 保存文件
-        file_path = await file_manager.save_upload_file(content, file.filename)
+        # 流式保存文件
+        file_path, size, md5 = await file_manager.save_upload_file(file, file.filename)
+        await FastAPICache.clear(namespace=NOVEL_LIST_CACHE_NAMESPACE)
         
         return {
             "success": True,
             "filePath": file_path,
             "filename": file.filename,
-            "size": len(content)
+            "size": size,
+            "md5": md5
         }
     except Exception as e:
         logger.error(f"上传失败: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/list")
+@cache(expire=NOVEL_LIST_CACHE_EXPIRE, namespace=NOVEL_LIST_CACHE_NAMESPACE)
 async def list_novels():
     """
     列出所有小说文件
@@ -292,11 +359,11 @@ async def export_novel(data: PublicationData, format: str = "json"):
     """
     try:
         if format == "json":
-            json_str = await file_manager.export_json(data)
+            json_bytes = await file_manager.export_json(data)
             return {
                 "success": True,
                 "format": "json",
-                "content": json_str
+                "content": json_bytes.decode('utf-8')
             }
         elif format == "markdown":
             content = file_manager._reconstruct_markdown(data)
@@ -2,9 +2,12 @@
 文本清理API路由
 """
 from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Optional, List, Dict, Any, Callable, Tuple
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
 import logging
+import os
 
 from services.text_strip_service import text_strip_service
 
@@ -13,9 +16,62 @@ logger = logging.getLogger(__name__)
 # 创建路由器
 router = APIRouter(prefix="/api/strip", tags=["text-strip"])
 
+# 批量文本数达到该阈值时改用进程池，绕开GIL并行执行正则清理
+PROCESS_POOL_THRESHOLD = 32
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    """按需创建进程池（避免模块导入时就派生子进程）"""
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=os.cpu_count())
+    return _process_pool
+
+
+def shutdown_process_pool() -> None:
+    """关闭进程池并取消未开始的任务（应用关闭时调用，避免遗留子进程）"""
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(cancel_futures=True)
+        _process_pool = None
+
+
+# 清理类型分发表，统一签名为 (text, options) -> str
+_STRIP_DISPATCH: Dict[str, Callable[[str, Optional[Dict[str, Any]]], str]] = {
+    "basic": lambda text, options: text_strip_service.strip_basic(text),
+    "clean": lambda text, options: text_strip_service.extract_clean_text(text),
+    "publish": lambda text, options: text_strip_service.prepare_for_publishing(text),
+    "smart": text_strip_service.smart_strip,
+}
+
+
+def _get_strip_func(strip_type: str) -> Callable[[str, Optional[Dict[str, Any]]], str]:
+    """查找清理类型对应的处理函数"""
+    func = _STRIP_DISPATCH.get(strip_type)
+    if func is None:
+        raise ValueError(f"不支持的清理类型: {strip_type}")
+    return func
+
+
+def _strip_one(text: str, strip_type: str, options: Optional[Dict[str, Any]]) -> Tuple[str, Dict[str, int]]:
+    """清理单条文本并统计（同步函数，在线程或子进程中执行）"""
+    cleaned = _STRIP_DISPATCH[strip_type](text, options)
+    # clean类型的结果就是统计所需的干净文本，直接复用避免再清理一遍
+    clean_text = cleaned if strip_type == "clean" else None
+    return cleaned, text_strip_service.get_stats(text, clean_text)
+
+
+def _strip_batch(texts: List[str], strip_type: str, options: Optional[Dict[str, Any]]) -> List[Tuple[str, Dict[str, int]]]:
+    """顺序清理一批文本（一次线程切换或一次进程间传输处理整批）"""
+    return [_strip_one(text, strip_type, options) for text in texts]
+
 
 class StripRequest(BaseModel):
     """文本清理请求"""
+    model_config = ConfigDict(defer_build=True)
+    
     text: str = Field(..., description="要清理的文本")
     strip_type: str = Field(default="smart", description="清理类型: basic, clean, publish, smart")
     options: Optional[Dict[str, Any]] = Field(None, description="清理选项")
@@ -23,6 +79,8 @@ class StripRequest(BaseModel):
 
 class StripResponse(BaseModel):
     """文本清理响应"""
+    model_config = ConfigDict(defer_build=True)
+    
     original_text: str = Field(..., description="原始文本")
     cleaned_text: str = Field(..., description="清理后的文本")
     stats: Dict[str, int] = Field(..., description="文本统计")
@@ -31,6 +89,8 @@ class StripResponse(BaseModel):
 
 class BatchStripRequest(BaseModel):
     """批量文本清理请求"""
+    model_config = ConfigDict(defer_build=True)
+    
     texts: List[str] = Field(..., description="要清理的文本列表")
     strip_type: str = Field(default="smart", description="清理类型")
     options: Optional[Dict[str, Any]] = Field(None, description="清理选项")
@@ -38,6 +98,8 @@ class BatchStripRequest(BaseModel):
 
 class SpecificStripRequest(BaseModel):
     """特定类型清理请求"""
+    model_config = ConfigDict(defer_build=True)
+    
     text: str = Field(..., description="要清理的文本")
     strip_types: List[str] = Field(..., description="要应用的清理类型列表")
 
@@ -56,20 +118,9 @@ async def strip_text(request: StripRequest):
     try:
         logger.info(f"开始清理文本，类型: {request.strip_type}")
         
-        # 根据类型选择清理方法
-        if request.strip_type == "basic":
-            cleaned = text_strip_service.strip_basic(request.text)
-        elif request.strip_type == "clean":
-            cleaned = text_strip_service.extract_clean_text(request.text)
-        elif request.strip_type == "publish":
-            cleaned = text_strip_service.prepare_for_publishing(request.text)
-        elif request.strip_type == "smart":
-            cleaned = text_strip_service.smart_strip(request.text, request.options)
-        else:
-            raise ValueError(f"不支持的清理类型: {request.strip_type}")
-        
-        # 获取统计信息
-        stats = text_strip_service.get_stats(request.text)
+        # 校验清理类型后清理并统计
+        _get_strip_func(request.strip_type)
+        cleaned, stats = await asyncio.to_thread(_strip_one, request.text, request.strip_type, request.options)
         
         return StripResponse(
             original_text=request.text,
@@ -87,30 +138,33 @@ async def strip_text(request: StripRequest):
 async def batch_strip_text(request: BatchStripRequest):
     """批量清理文本"""
     try:
-        results = []
+        # 在分发前统一校验清理类型
+        _get_strip_func(request.strip_type)
         
-        for text in request.texts:
-            if request.strip_type == "basic":
-                cleaned = text_strip_service.strip_basic(text)
-            elif request.strip_type == "clean":
-                cleaned = text_strip_service.extract_clean_text(text)
-            elif request.strip_type == "publish":
-                cleaned = text_strip_service.prepare_for_publishing(text)
-            elif request.strip_type == "smart":
-                cleaned = text_strip_service.smart_strip(text, request.options)
-            else:
-                raise ValueError(f"不支持的清理类型: {request.strip_type}")
-            
-            stats = text_strip_service.get_stats(text)
-            
-            results.append(StripResponse(
+        texts = request.texts
+        if len(texts) >= PROCESS_POOL_THRESHOLD:
+            # 按进程数切分成大块提交，每块只序列化和传输一次
+            loop = asyncio.get_running_loop()
+            pool = _get_process_pool()
+            size = -(-len(texts) // (os.cpu_count() or 1))
+            batches = await asyncio.gather(*[
+                loop.run_in_executor(pool, _strip_batch, texts[i:i + size], request.strip_type, request.options)
+                for i in range(0, len(texts), size)
+            ])
+            outputs = [output for batch in batches for output in batch]
+        else:
+            # 文本较少时整批放到一个线程里处理，避免阻塞事件循环
+            outputs = await asyncio.to_thread(_strip_batch, texts, request.strip_type, request.options)
+        
+        return [
+            StripResponse(
                 original_text=text,
                 cleaned_text=cleaned,
                 stats=stats,
                 strip_type=request.strip_type
-            ))
-        
-        return results
+            )
+            for text, (cleaned, stats) in zip(request.texts, outputs)
+        ]
         
     except Exception as e:
         logger.error(f"批量清理失败: {e}")
@@ -1,5 +1,6 @@
 from .parser import NovelParser
 from .claude_service import ClaudeService
-from .file_manager import FileManager
+from .file_manager import FileManager, dump_publication
+from .metadata_cache import MetadataCache
 
-__all__ = ['NovelParser', 'ClaudeService', 'FileManager']
\ No newline at end of file
+__all__ = ['NovelParser', 'ClaudeService', 'FileManager', 'MetadataCache', 'dump_publication']
\ No newline at end of file
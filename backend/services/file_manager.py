@@ -2,16 +2,117 @@
 文件管理服务
 """
 import aiofiles
-import json
+import asyncio
+import hashlib
+import orjson
+import os
+import time
 from pathlib import Path
 from datetime import datetime
 import shutil
 import logging
-from typing import Optional
+from contextlib import contextmanager
+from typing import Iterator, Optional, Tuple
+from fastapi import UploadFile
 from models.publication import PublicationData
 
 logger = logging.getLogger(__name__)
 
+# 上传文件分块写入的块大小（1MB）
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+# 重构Markdown时的固定头部模板，只有字段值需要在运行时填入
+_MARKDOWN_HEADER_TMPL = (
+    "# 女频小说初稿\n\n"
+    "# {title}\n\n"
+    "---\n\n"
+    "**作者**: {author}\n\n"
+    "**分类**: {first} > {second} > {third}\n\n"
+    "## 作品简介\n\n"
+    "{intro}\n\n"
+    "## 精彩片段\n\n"
+    "{paragraph}\n\n"
+    "---\n"
+)
+
+def _timestamp() -> str:
+    """当前本地时间的文件名时间戳（time.strftime直接格式化struct_time，不构造datetime对象）"""
+    return time.strftime("%Y%m%d_%H%M%S")
+
+def _fast_copy(source: Path, target: Path) -> None:
+    """
+    复制文件并保留元数据
+    
+    优先使用os.copy_file_range：数据在内核中复制，不经过用户态缓冲区，
+    btrfs/XFS等文件系统上还可直接共享数据块（reflink）。
+    平台不支持或跨文件系统时回退到shutil.copy2。
+    """
+    if hasattr(os, 'copy_file_range'):
+        try:
+            with open(source, 'rb') as fsrc, open(target, 'wb') as fdst:
+                remaining = os.fstat(fsrc.fileno()).st_size
+                while remaining > 0:
+                    copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                    if copied == 0:
+                        break
+                    remaining -= copied
+            shutil.copystat(source, target)
+            return
+        except OSError:
+            pass
+    shutil.copy2(source, target)
+
+def _iter_markdown_files(path: Path) -> Iterator[dict]:
+    """
+    递归遍历目录下的.md文件
+    
+    使用os.scandir：目录项自带文件类型，每个文件只需一次stat获取大小和修改时间
+    """
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _iter_markdown_files(entry.path)
+            elif entry.name.endswith('.md'):
+                stat = entry.stat()
+                yield {
+                    "path": entry.path,
+                    "name": entry.name,
+                    "size": stat.st_size,
+                    "modified": datetime.fromtimestamp(stat.st_mtime).isoformat()
+                }
+
+def dump_publication(data: PublicationData, exclude: Optional[set] = None, indent: bool = False) -> bytes:
+    """
+    将发布数据序列化为JSON字节（文件导出和HTTP响应共用同一编码器）
+    
+    Args:
+        data: 发布数据
+        exclude: 需要排除的字段
+        indent: 是否缩进输出
+        
+    Returns:
+        UTF-8编码的JSON
+    """
+    option = orjson.OPT_INDENT_2 if indent else 0
+    return orjson.dumps(data.model_dump(exclude=exclude), option=option)
+
+@contextmanager
+def _log_failure(action: str, target: Optional[object] = None) -> Iterator[None]:
+    """
+    记录文件操作失败后原样抛出
+    
+    只捕获文件读写中预期会出现的错误（OSError，以及编解码引发的ValueError），
+    其余异常直接向上传递，由路由层统一记录。
+    """
+    try:
+        yield
+    except (OSError, ValueError) as e:
+        if target is None:
+            logger.error("%s失败: %s", action, e)
+        else:
+            logger.error("%s失败 %s: %s", action, target, e)
+        raise
+
 class FileManager:
     """文件管理器"""
     
@@ -40,14 +141,11 @@ class FileManager:
         Returns:
             文件内容
         """
-        try:
+        with _log_failure("读取文件", file_path):
             async with aiofiles.open(file_path, 'r', encoding='utf-8') as f:
                 content = await f.read()
-            logger.info(f"成功读取文件: {file_path}")
+            logger.info("成功读取文件: %s", file_path)
             return content
-        except Exception as e:
-            logger.error(f"读取文件失败 {file_path}: {e}")
-            raise
     
     async def save_novel_file(self, file_path: str, data: PublicationData) -> None:
         """
@@ -57,23 +155,19 @@ class FileManager:
             file_path: 文件路径
             data: 发布数据
         """
-        try:
+        with _log_failure("保存文件", file_path):
             # 先备份原文件
             backup_file = await self.backup_file(file_path)
-            logger.info(f"已备份文件到: {backup_file}")
+            logger.info("已备份文件到: %s", backup_file)
             
-            # 重构MD内容
-            content = self._reconstruct_markdown(data)
+            # 在线程中重构MD内容并编码，避免大篇幅小说阻塞事件循环
+            content = await asyncio.to_thread(self._render_markdown, data)
             
-            # 保存文件
-            async with aiofiles.open(file_path, 'w', encoding='utf-8') as f:
+            # 一次写入编码后的字节
+            async with aiofiles.open(file_path, 'wb') as f:
                 await f.write(content)
             
-            logger.info(f"成功保存文件: {file_path}")
-            
-        except Exception as e:
-            logger.error(f"保存文件失败 {file_path}: {e}")
-            raise
+            logger.info("成功保存文件: %s", file_path)
     
     def _reconstruct_markdown(self, data: PublicationData) -> str:
         """
@@ -85,39 +179,27 @@ class FileManager:
         Returns:
             Markdown格式的内容
         """
-        lines = [
-            "# 女频小说初稿",
-            "",
-            f"# {data.title}",
-            "",
-            "---",
-            "",
-            f"**作者**: {data.author}",
-            "",
-            f"**分类**: {data.firstCategory} > {data.secondCategory} > {data.thirdCategory}",
-            "",
-            "## 作品简介",
-            "",
-            data.intro,
-            "",
-            "## 精彩片段",
-            "",
-            data.awesomeParagraph,
-            "",
-            "---",
-            ""
-        ]
-        
-        # 添加章节内容
-        for chapter in data.chapterList:
-            lines.append(f"## {chapter.chapterTitle}")
-            lines.append("")
-            lines.append(chapter.content)
-            lines.append("")
-        
-        return '\n'.join(lines)
+        header = _MARKDOWN_HEADER_TMPL.format(
+            title=data.title,
+            author=data.author,
+            first=data.firstCategory,
+            second=data.secondCategory,
+            third=data.thirdCategory,
+            intro=data.intro,
+            paragraph=data.awesomeParagraph
+        )
+        # 章节逐个拼接，末尾不留多余空行
+        body = ''.join(
+            f"\n## {chapter.chapterTitle}\n\n{chapter.content}\n"
+            for chapter in data.chapterList
+        )
+        return header + body
+    
+    def _render_markdown(self, data: PublicationData) -> bytes:
+        """重构Markdown并编码为UTF-8（供保存文件使用）"""
+        return self._reconstruct_markdown(data).encode('utf-8')
     
-    async def export_json(self, data: PublicationData, output_path: Optional[str] = None) -> str:
+    async def export_json(self, data: PublicationData, output_path: Optional[str] = None) -> bytes:
         """
         导出JSON格式
         
@@ -126,24 +208,19 @@ class FileManager:
             output_path: 输出路径（可选）
             
         Returns:
-            JSON字符串
+            UTF-8编码的JSON字节
         """
-        try:
-            # 转换为字典并移除metadata
-            data_dict = data.dict(exclude={'metadata'})
-            json_str = json.dumps(data_dict, ensure_ascii=False, indent=2)
+        with _log_failure("导出JSON"):
+            # 移除metadata后序列化，orjson直接输出UTF-8字节（不转义中文）
+            json_bytes = dump_publication(data, exclude={'metadata'}, indent=True)
             
-            # 如果指定了输出路径，保存到文件
+            # 如果指定了输出路径，直接写入字节，省去编码往返
             if output_path:
-                async with aiofiles.open(output_path, 'w', encoding='utf-8') as f:
-                    await f.write(json_str)
-                logger.info(f"JSON已导出到: {output_path}")
+                async with aiofiles.open(output_path, 'wb') as f:
+                    await f.write(json_bytes)
+                logger.info("JSON已导出到: %s", output_path)
             
-            return json_str
-            
-        except Exception as e:
-            logger.error(f"导出JSON失败: {e}")
-            raise
+            return json_bytes
     
     async def backup_file(self, file_path: str) -> str:
         """
@@ -155,23 +232,19 @@ class FileManager:
         Returns:
             备份文件路径
         """
-        try:
+        with _log_failure("备份文件", file_path):
             source = Path(file_path)
             
             # 生成备份文件名
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            timestamp = _timestamp()
             backup_name = f"{source.stem}_{timestamp}{source.suffix}"
             backup_file = self.backup_path / backup_name
             
-            # 执行备份
-            shutil.copy2(source, backup_file)
-            logger.info(f"文件已备份: {source} -> {backup_file}")
+            # 执行备份（在线程中复制，不阻塞事件循环）
+            await asyncio.to_thread(_fast_copy, source, backup_file)
+            logger.info("文件已备份: %s -> %s", source, backup_file)
             
             return str(backup_file)
-            
-        except Exception as e:
-            logger.error(f"备份文件失败 {file_path}: {e}")
-            raise
     
     async def list_novels(self) -> list:
         """
@@ -180,40 +253,35 @@ class FileManager:
         Returns:
             小说文件列表
         """
-        novels = []
-        for file in self.novels_path.glob("**/*.md"):
-            novels.append({
-                "path": str(file),
-                "name": file.name,
-                "size": file.stat().st_size,
-                "modified": datetime.fromtimestamp(file.stat().st_mtime).isoformat()
-            })
-        return novels
+        # 目录遍历和stat在线程中进行，不阻塞事件循环
+        return await asyncio.to_thread(lambda: list(_iter_markdown_files(self.novels_path)))
     
-    async def save_upload_file(self, file_content: bytes, filename: str) -> str:
+    async def save_upload_file(self, upload_file: UploadFile, filename: str) -> Tuple[str, int, str]:
         """
-        保存上传的文件
+        保存上传的文件（分块流式写入，不在内存中缓存完整文件）
         
         Args:
-            file_content: 文件内容
+            upload_file: 上传的文件对象
             filename: 文件名
             
         Returns:
-            保存的文件路径
+            (保存的文件路径, 文件大小, MD5摘要)
         """
-        try:
+        with _log_failure("保存上传文件"):
             # 生成唯一文件名
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            timestamp = _timestamp()
             safe_filename = f"{timestamp}_{filename}"
             file_path = self.novels_path / safe_filename
             
-            # 保存文件
+            # 分块保存文件，同时增量计算大小和MD5
+            size = 0
+            md5 = hashlib.md5()
             async with aiofiles.open(file_path, 'wb') as f:
-                await f.write(file_content)
-            
-            logger.info(f"上传文件已保存: {file_path}")
-            return str(file_path)
+                while chunk := await upload_file.read(UPLOAD_CHUNK_SIZE):
+                    await f.write(chunk)
+                    md5.update(chunk)
+                    size += len(chunk)
             
-        except Exception as e:
-            logger.error(f"保存上传文件失败: {e}")
-            raise
\ No newline at end of file
+            logger.info("上传文件已保存: %s", file_path)
+            return str(file_path), size, md5.hexdigest()
+
@@ -0,0 +1,90 @@
+"""
+元数据缓存服务
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+import orjson
+from contextlib import closing
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 计算缓存键时每章参与哈希的字符数
+KEY_CONTENT_CHARS = 2000
+
+class MetadataCache:
+    """基于SQLite的元数据缓存（按标题和章节内容指纹精确匹配）"""
+    
+    def __init__(self, db_path: str, ttl: int):
+        """
+        初始化元数据缓存
+        
+        Args:
+            db_path: SQLite数据库文件路径
+            ttl: 缓存有效期（秒）
+        """
+        self.db_path = Path(db_path)
+        self.ttl = ttl
+        
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS meta_cache ("
+                "key TEXT PRIMARY KEY, json TEXT NOT NULL, ts INTEGER NOT NULL)"
+            )
+    
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path)
+    
+    @staticmethod
+    def make_key(title: str, chapters: List[dict]) -> str:
+        """
+        计算缓存键
+        
+        Args:
+            title: 作品标题
+            chapters: 章节列表
+            
+        Returns:
+            标题和各章标题、内容前缀的哈希值
+        """
+        digest = hashlib.blake2b(title.encode('utf-8'), digest_size=16)
+        for ch in chapters:
+            digest.update(ch['chapterTitle'].encode('utf-8'))
+            digest.update(ch['content'][:KEY_CONTENT_CHARS].encode('utf-8'))
+        return digest.hexdigest()
+    
+    def _get(self, key: str) -> Optional[Dict]:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT json FROM meta_cache WHERE key = ? AND ts >= ?",
+                (key, int(time.time()) - self.ttl)
+            ).fetchone()
+        return orjson.loads(row[0]) if row else None
+    
+    def _set(self, key: str, metadata: Dict) -> None:
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO meta_cache (key, json, ts) VALUES (?, ?, ?)",
+                (key, orjson.dumps(metadata, option=orjson.OPT_NON_STR_KEYS).decode('utf-8'), int(time.time()))
+            )
+    
+    async def get(self, key: str) -> Optional[Dict]:
+        """读取未过期的缓存，未命中返回None"""
+        try:
+            return await asyncio.to_thread(self._get, key)
+        except (sqlite3.Error, json.JSONDecodeError) as e:
+            logger.error("读取元数据缓存失败: %s", e)
+            return None
+    
+    async def set(self, key: str, metadata: Dict) -> None:
+        """写入缓存"""
+        try:
+            await asyncio.to_thread(self._set, key, metadata)
+        except (sqlite3.Error, orjson.JSONEncodeError) as e:
+            logger.error("写入元数据缓存失败: %s", e)
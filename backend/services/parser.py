@@ -2,10 +2,19 @@
 Markdown小说解析服务
 """
 import re
-from typing import List, Dict
+from typing import List, Dict, Tuple
 import aiofiles
 from pathlib import Path
 
+# 章节标题（二级标题），空白不跨行
+_CHAPTER_HEADING_RE = re.compile(r'^##[^\S\n]+(.+?)$', re.MULTILINE)
+# 作品标题候选行（去掉行首空白后以单个#开头）及其#号前缀
+_TITLE_LINE_RE = re.compile(r'^[^\S\n]*#(?!#).*$', re.MULTILINE)
+_TITLE_MARK_RE = re.compile(r'^#+\s*')
+
+# 不计入字数的字符：Markdown标记和空白
+_NON_WORD_CHARS = '#*`[]() \n\r'
+
 class NovelParser:
     """小说解析器"""
     
@@ -20,8 +29,7 @@ class NovelParser:
             包含标题、章节、统计信息的字典
         """
         content = await self.read_file(file_path)
-        title = self.extract_title(content)
-        chapters = self.extract_chapters(content)
+        title, chapters = self._scan(content)
         stats = self.calculate_stats(content, chapters)
         
         return {
@@ -46,25 +54,7 @@ class NovelParser:
         Returns:
             作品标题
         """
-        lines = content.split('\n')
-        
-        # 查找第一个以#开头的行（但不是##）
-        for line in lines:
-            line = line.strip()
-            if line.startswith('#') and not line.startswith('##'):
-                # 移除#号和空格
-                title = re.sub(r'^#+\s*', '', line).strip()
-                if title:
-                    return title
-        
-        # 如果没找到#标题，尝试第3行（兼容旧格式）
-        if len(lines) >= 3:
-            title = lines[2].strip()
-            title = title.replace('#', '').strip()
-            if title:
-                return title
-                
-        return "未命名作品"
+        return self._scan(content)[0]
     
     def extract_chapters(self, content: str) -> List[Dict[str, str]]:
         """
@@ -76,38 +66,49 @@ class NovelParser:
         Returns:
             章节列表，每个章节包含标题和内容
         """
-        chapters = []
-        # 匹配二级标题作为章节标题
-        pattern = r'^##\s+(.+?)$'
-        lines = content.split('\n')
+        return self._scan(content)[1]
+    
+    def _scan(self, content: str) -> Tuple[str, List[Dict[str, str]]]:
+        """
+        提取标题和章节
         
-        current_title = None
-        current_content = []
+        章节正文直接按相邻章节标题的位置切片，不拆分行、不逐行累积
         
-        for i, line in enumerate(lines):
-            match = re.match(pattern, line)
-            if match:
-                # 保存前一章节
-                if current_title:
-                    chapters.append({
-                        "chapterTitle": current_title,
-                        "content": '\n'.join(current_content).strip()
-                    })
-                # 开始新章节
-                current_title = match.group(1)
-                current_content = []
-            elif current_title:
-                # 累积章节内容
-                current_content.append(line)
+        Args:
+            content: 文件内容
+            
+        Returns:
+            (作品标题, 章节列表)
+        """
+        headings = list(_CHAPTER_HEADING_RE.finditer(content))
+        ends = [match.start() for match in headings[1:]]
+        ends.append(len(content))
+        chapters = [
+            {
+                "chapterTitle": match.group(1),
+                "content": content[match.end():end].strip()
+            }
+            for match, end in zip(headings, ends)
+        ]
+        
+        return self._find_title(content), chapters
+    
+    def _find_title(self, content: str) -> str:
+        """查找第一个以#开头的行（但不是##）作为标题"""
+        for match in _TITLE_LINE_RE.finditer(content):
+            # 移除#号和空格
+            title = _TITLE_MARK_RE.sub('', match.group().strip()).strip()
+            if title:
+                return title
         
-        # 添加最后一章
-        if current_title:
-            chapters.append({
-                "chapterTitle": current_title,
-                "content": '\n'.join(current_content).strip()
-            })
+        # 如果没找到#标题，尝试第3行（兼容旧格式）
+        lines = content.split('\n', 3)
+        if len(lines) >= 3:
+            title = lines[2].replace('#', '').strip()
+            if title:
+                return title
         
-        return chapters
+        return "未命名作品"
     
     def calculate_stats(self, content: str, chapters: List[Dict]) -> Dict:
         """
@@ -120,12 +121,10 @@ class NovelParser:
         Returns:
             统计信息字典
         """
-        # 移除Markdown标记计算实际字数
-        text = re.sub(r'[#*`\[\]()]', '', content)
-        # 移除空格和换行
-        text = text.replace(' ', '').replace('\n', '').replace('\r', '')
+        # 实际字数 = 总长度 - Markdown标记和空白的数量（str.count不创建中间字符串）
+        word_count = len(content) - sum(content.count(ch) for ch in _NON_WORD_CHARS)
         
         return {
-            "wordCount": len(text),
+            "wordCount": word_count,
             "chapterCount": len(chapters)
         }
\ No newline at end of file
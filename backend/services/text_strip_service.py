@@ -3,12 +3,136 @@
 提供各种文本清理、格式化和优化功能
 """
 import re
-from typing import Optional, List, Dict, Any
+from types import MappingProxyType
+from typing import Optional, List, Dict, Any, Mapping
 import unicodedata
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 预编译的正则表达式（模块加载时编译一次，方法内直接调用.sub）
+_HTML_TAG_RE = re.compile('<.*?>')
+
+# Markdown格式：行首标记（标题、引用、列表、分割线）合并为一个模式，
+# 行内标记（代码块、强调、链接、图片、行内代码）合并为另一个模式。
+# 嵌套的标记（如链接包在粗体里、引用里的列表）一次扫描只能剥掉外层，
+# strip_markdown会重复两次扫描直到没有可替换的内容。行内模式开头的前瞻
+# 列出所有分支的起始字符，正则引擎据此直接跳到候选位置，纯文本段落几乎没有额外开销
+_MD_LINE_RE = re.compile(
+    r'^(?:#{1,6}\s+|>\s+|[\*\-\+]\s+|\d+\.\s+|[\*\-_]{3,}$)',
+    re.MULTILINE
+)
+_MD_INLINE_RE = re.compile(
+    r'(?=[`*_\[!])(?:'
+    r'(?P<codeblock>```[^`]*```)'
+    r'|\*{1,3}(?P<bold>[^\*]+)\*{1,3}'
+    r'|_{1,3}(?P<underscore>[^_]+)_{1,3}'
+    r'|\[(?P<link>[^\]]+)\]\([^\)]+\)'
+    r'|(?P<image>!\[\]\([^\)]+\))'  # 有替代文字的图片按链接处理，只保留文字
+    r'|`(?P<code>[^`]+)`'
+    r')'
+)
+_MD_KEEP_GROUPS = frozenset(('bold', 'underscore', 'link', 'code'))
+
+
+def _md_inline_sub(match: 're.Match') -> str:
+    """行内标记替换：强调、链接、行内代码保留文字，代码块和图片删除"""
+    group = match.lastgroup
+    return match.group(group) if group in _MD_KEEP_GROUPS else ''
+
+_DIGITS_RE = re.compile(r'\d+')
+_CHINESE_NUMERALS_RE = re.compile(r'[零一二三四五六七八九十百千万亿壹贰叁肆伍陆柒捌玖拾佰仟萬億]')
+_SPECIAL_CHARS_RE = re.compile('[^\\u4e00-\\u9fa5a-zA-Z0-9]')
+_EMOJI_RE = re.compile(
+    "["
+    "\U0001F600-\U0001F64F"  # emoticons
+    "\U0001F300-\U0001F5FF"  # symbols & pictographs
+    "\U0001F680-\U0001F6FF"  # transport & map symbols
+    "\U0001F1E0-\U0001F1FF"  # flags
+    "\U00002702-\U000027B0"  # dingbats
+    "\U000024C2"              # circled M
+    "\U0001F170-\U0001F251"  # enclosed alphanumeric & ideographic supplement
+    "]+", 
+    flags=re.UNICODE
+)
+_URL_RE = re.compile(r'https?://[^\s]+')
+_EMAIL_RE = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
+
+# 章节编号的各种格式，合并为一个模式一次扫描完成。
+# 各分支按原先逐个替换的顺序排成可选组，从而等价于依次替换：
+# 前一种编号去掉后，紧随其后的另一种编号同样会被去掉。
+# 开头的前瞻排除不可能匹配的行首，避免在每一行产生空匹配
+_CHAPTER_NUMBER_RE = re.compile(
+    r'^(?=[第\dc])'
+    r'(?:第[零一二三四五六七八九十百千万\d]+章\s*)?'
+    r'(?:Chapter\s+\d+\s*)?'
+    r'(?:\d+\.\s*)?'
+    r'(?:第\d+节\s*)?'
+    r'(?:第[零一二三四五六七八九十百千万]+节\s*)?',
+    re.MULTILINE | re.IGNORECASE
+)
+
+# 引号统一为英文引号（弯引号、直角引号）
+_QUOTE_TABLE = str.maketrans({
+    '\u201c': '"', '\u201d': '"',
+    '\u2018': "'", '\u2019': "'",
+    '「': '"', '」': '"',
+    '『': '"', '』': '"'
+})
+
+# 中文标点转英文；单字符替换通过一次translate完成，"——"是两个字符，单独替换
+_PUNCTUATION_TABLE = str.maketrans({
+    '，': ',',
+    '。': '.',
+    '！': '!',
+    '？': '?',
+    '；': ';',
+    '：': ':',
+    '（': '(',
+    '）': ')',
+    '【': '[',
+    '】': ']',
+    '、': ',',
+    '…': '...'
+})
+
+class _InvisibleCharTable(dict):
+    """
+    str.translate用的删除表：Unicode类别为C*（控制、格式、代理、私用、未分配）
+    的字符映射为None（删除），其余映射为自身（保留）。
+    
+    按需填充：每个字符只在首次出现时查询一次unicodedata，
+    之后translate直接在C层查表，不再逐字符调用Python函数。
+    """
+    
+    def __missing__(self, codepoint: int) -> Optional[int]:
+        value = None if unicodedata.category(chr(codepoint))[0] == 'C' else codepoint
+        self[codepoint] = value
+        return value
+
+_INVISIBLE_CHAR_TABLE = _InvisibleCharTable()
+
+# 统计用字符类别（匹配连续的一段，按段累加长度，避免为每个字符创建字符串）
+_CHINESE_RUN_RE = re.compile(r'[\u4e00-\u9fa5]+')
+_ENGLISH_RUN_RE = re.compile(r'[a-zA-Z]+')
+_DIGIT_RUN_RE = re.compile(r'\d+')
+
+
+def _count_chars(pattern: 're.Pattern', text: str) -> int:
+    """统计text中属于pattern字符类别的字符总数"""
+    return sum(map(len, pattern.findall(text)))
+
+# smart_strip的默认选项（只读，所有调用共享同一份）
+_DEFAULT_SMART_OPTS = MappingProxyType({
+    'strip_whitespace': True,
+    'strip_html': True,
+    'strip_markdown': False,
+    'strip_punctuation': False,
+    'strip_urls': True,
+    'strip_emoji': True,
+    'normalize': True
+})
+
 class TextStripService:
     """文本清理专家服务"""
     
@@ -16,9 +140,9 @@ class TextStripService:
         """初始化文本清理服务"""
         # 定义各种清理规则
         self.punctuation_patterns = {
-            'chinese': r'[。，、；：？！""''（）《》【】……——]',
-            'english': r'[.,;:?!\'"()\[\]{}<>]',
-            'special': r'[@#$%^&*+=|\\~`]'
+            'chinese': re.compile(r'[。，、；：？！""''（）《》【】……——]'),
+            'english': re.compile(r'[.,;:?!\'"()\[\]{}<>]'),
+            'special': re.compile(r'[@#$%^&*+=|\\~`]')
         }
         
     def strip_basic(self, text: str) -> str:
@@ -27,12 +151,13 @@ class TextStripService:
     
     def strip_all_whitespace(self, text: str) -> str:
         """去除所有空白字符（包括中间的）"""
-        return re.sub(r'\s+', '', text)
+        # str.split()无参数时按空白切分（与正则\s字符集相同），在C层完成
+        return ''.join(text.split())
     
     def strip_extra_whitespace(self, text: str) -> str:
         """将多个空白字符合并为单个空格"""
-        text = re.sub(r'\s+', ' ', text)
-        return text.strip()
+        # 切分时自动去掉首尾空白，等价于先合并再strip
+        return ' '.join(text.split())
     
     def strip_empty_lines(self, text: str) -> str:
         """去除空行"""
@@ -40,19 +165,12 @@ class TextStripService:
         return '\n'.join(lines)
     
     def strip_duplicate_lines(self, text: str) -> str:
-        """去除重复行"""
-        seen = set()
-        lines = []
-        for line in text.split('\n'):
-            if line not in seen:
-                seen.add(line)
-                lines.append(line)
-        return '\n'.join(lines)
+        """去除重复行（保留首次出现的顺序）"""
+        return '\n'.join(dict.fromkeys(text.split('\n')))
     
     def strip_html_tags(self, text: str) -> str:
         """去除HTML标签"""
-        clean = re.compile('<.*?>')
-        return re.sub(clean, '', text)
+        return _HTML_TAG_RE.sub('', text)
     
     def strip_markdown(self, text: str, keep_text: bool = True) -> str:
         """
@@ -65,25 +183,15 @@ class TextStripService:
         if not keep_text:
             return ""
         
-        # 去除标题标记
-        text = re.sub(r'^#{1,6}\s+', '', text, flags=re.MULTILINE)
-        # 去除粗体和斜体
-        text = re.sub(r'\*{1,3}([^\*]+)\*{1,3}', r'\1', text)
-        text = re.sub(r'_{1,3}([^_]+)_{1,3}', r'\1', text)
-        # 去除链接
-        text = re.sub(r'\[([^\]]+)\]\([^\)]+\)', r'\1', text)
-        # 去除图片
-        text = re.sub(r'!\[([^\]]*)\]\([^\)]+\)', '', text)
-        # 去除代码块
-        text = re.sub(r'```[^`]*```', '', text, flags=re.DOTALL)
-        text = re.sub(r'`([^`]+)`', r'\1', text)
-        # 去除引用
-        text = re.sub(r'^>\s+', '', text, flags=re.MULTILINE)
-        # 去除列表标记
-        text = re.sub(r'^[\*\-\+]\s+', '', text, flags=re.MULTILINE)
-        text = re.sub(r'^\d+\.\s+', '', text, flags=re.MULTILINE)
-        # 去除分割线
-        text = re.sub(r'^[\*\-_]{3,}$', '', text, flags=re.MULTILINE)
+        # 嵌套的标记每轮剥掉一层，重复到没有可替换的内容为止
+        # （每次替换都会缩短文本，循环必然结束）
+        while True:
+            # 去除标题、引用、列表标记和分割线
+            text, line_count = _MD_LINE_RE.subn('', text)
+            # 去除强调、链接、图片和代码
+            text, inline_count = _MD_INLINE_RE.subn(_md_inline_sub, text)
+            if not (line_count or inline_count):
+                break
         
         return self.strip_extra_whitespace(text)
     
@@ -97,7 +205,7 @@ class TextStripService:
         """
         for ptype in types:
             if ptype in self.punctuation_patterns:
-                text = re.sub(self.punctuation_patterns[ptype], '', text)
+                text = self.punctuation_patterns[ptype].sub('', text)
         return text
     
     def strip_numbers(self, text: str, keep_chinese_numbers: bool = False) -> str:
@@ -109,11 +217,11 @@ class TextStripService:
             keep_chinese_numbers: 是否保留中文数字
         """
         # 去除阿拉伯数字
-        text = re.sub(r'\d+', '', text)
+        text = _DIGITS_RE.sub('', text)
         
         # 如果需要，去除中文数字
         if not keep_chinese_numbers:
-            text = re.sub(r'[零一二三四五六七八九十百千万亿壹贰叁肆伍陆柒捌玖拾佰仟萬億]', '', text)
+            text = _CHINESE_NUMERALS_RE.sub('', text)
         
         return text
     
@@ -128,93 +236,41 @@ class TextStripService:
         # 保留中文、英文、数字和指定字符
         if keep_chars:
             pattern = f'[^\\u4e00-\\u9fa5a-zA-Z0-9{re.escape(keep_chars)}]'
-        else:
-            pattern = '[^\\u4e00-\\u9fa5a-zA-Z0-9]'
-        return re.sub(pattern, '', text)
+            return re.sub(pattern, '', text)
+        return _SPECIAL_CHARS_RE.sub('', text)
     
     def strip_invisible_chars(self, text: str) -> str:
         """去除不可见字符（零宽字符等）"""
-        # 去除零宽字符
-        text = re.sub(r'[\u200b\u200c\u200d\ufeff]', '', text)
-        # 去除其他控制字符
-        text = ''.join(char for char in text if unicodedata.category(char)[0] != 'C')
-        return text
+        # 零宽字符属于Cf类别，与其他控制字符一起通过查表删除
+        return text.translate(_INVISIBLE_CHAR_TABLE)
     
     def strip_emoji(self, text: str) -> str:
         """去除emoji表情"""
-        emoji_pattern = re.compile(
-            "["
-            "\U0001F600-\U0001F64F"  # emoticons
-            "\U0001F300-\U0001F5FF"  # symbols & pictographs
-            "\U0001F680-\U0001F6FF"  # transport & map symbols
-            "\U0001F1E0-\U0001F1FF"  # flags
-            "\U00002702-\U000027B0"
-            "\U000024C2-\U0001F251"
-            "]+", 
-            flags=re.UNICODE
-        )
-        return emoji_pattern.sub('', text)
+        return _EMOJI_RE.sub('', text)
     
     def strip_urls(self, text: str) -> str:
         """去除URL链接"""
-        url_pattern = r'https?://[^\s]+'
-        return re.sub(url_pattern, '', text)
+        return _URL_RE.sub('', text)
     
     def strip_email(self, text: str) -> str:
         """去除邮箱地址"""
-        email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-        return re.sub(email_pattern, '', text)
+        return _EMAIL_RE.sub('', text)
     
     def strip_chapter_numbers(self, text: str) -> str:
         """去除章节编号"""
-        # 匹配各种章节格式
-        patterns = [
-            r'^第[零一二三四五六七八九十百千万\d]+章\s*',
-            r'^Chapter\s+\d+\s*',
-            r'^\d+\.\s*',
-            r'^第\d+节\s*',
-            r'^第[零一二三四五六七八九十百千万]+节\s*'
-        ]
-        
-        for pattern in patterns:
-            text = re.sub(pattern, '', text, flags=re.MULTILINE | re.IGNORECASE)
-        
-        return text
+        return _CHAPTER_NUMBER_RE.sub('', text)
     
     def normalize_quotes(self, text: str) -> str:
         """标准化引号"""
         # 将各种引号统一
-        text = re.sub(r'[""]', '"', text)
-        text = re.sub(r'['']', "'", text)
-        text = re.sub(r'「|」', '"', text)
-        text = re.sub(r'『|』', '"', text)
-        return text
+        return text.translate(_QUOTE_TABLE)
     
     def normalize_punctuation(self, text: str) -> str:
         """标准化标点符号"""
         # 中文标点转英文
-        replacements = {
-            '，': ',',
-            '。': '.',
-            '！': '!',
-            '？': '?',
-            '；': ';',
-            '：': ':',
-            '（': '(',
-            '）': ')',
-            '【': '[',
-            '】': ']',
-            '、': ',',
-            '…': '...',
-            '——': '--'
-        }
-        
-        for old, new in replacements.items():
-            text = text.replace(old, new)
-        
-        return text
+        return text.translate(_PUNCTUATION_TABLE).replace('——', '--')
     
-    def smart_strip(self, text: str, options: Dict[str, Any] = None) -> str:
+    def smart_strip(self, text: str, options: Optional[Mapping[str, Any]] = None) -> str:
         """
         智能清理文本
         
@@ -232,38 +288,37 @@ class TextStripService:
         if not text:
             return ""
         
-        options = options or {
-            'strip_whitespace': True,
-            'strip_html': True,
-            'strip_markdown': False,
-            'strip_punctuation': False,
-            'strip_urls': True,
-            'strip_emoji': True,
-            'normalize': True
-        }
+        options = options or _DEFAULT_SMART_OPTS
+        get = options.get
+        (strip_html, strip_markdown, strip_urls, strip_emoji,
+         strip_punctuation, normalize, strip_whitespace) = (
+            get('strip_html'), get('strip_markdown'), get('strip_urls'),
+            get('strip_emoji'), get('strip_punctuation'), get('normalize'),
+            get('strip_whitespace')
+        )
         
         # 按顺序处理
-        if options.get('strip_html'):
+        if strip_html:
             text = self.strip_html_tags(text)
         
-        if options.get('strip_markdown'):
+        if strip_markdown:
             text = self.strip_markdown(text)
         
-        if options.get('strip_urls'):
+        if strip_urls:
             text = self.strip_urls(text)
         
-        if options.get('strip_emoji'):
+        if strip_emoji:
             text = self.strip_emoji(text)
         
-        if options.get('strip_punctuation'):
+        if strip_punctuation:
             text = self.strip_punctuation(text)
         
-        if options.get('normalize'):
+        if normalize:
             text = self.normalize_quotes(text)
         
-        if options.get('strip_whitespace'):
+        if strip_whitespace:
+            # 空白合并后已不含换行，无需再按行去除空行
             text = self.strip_extra_whitespace(text)
-            text = self.strip_empty_lines(text)
         
         # 最后清理不可见字符
         text = self.strip_invisible_chars(text)
@@ -281,8 +336,8 @@ class TextStripService:
         text = self.strip_email(text)
         text = self.strip_emoji(text)
         text = self.strip_invisible_chars(text)
+        # 空白合并后已不含换行，无需再按行去除空行
         text = self.strip_extra_whitespace(text)
-        text = self.strip_empty_lines(text)
         
         return text
     
@@ -309,19 +364,24 @@ class TextStripService:
         
         return '\n\n'.join(cleaned_paragraphs)
     
-    def get_stats(self, text: str) -> Dict[str, int]:
+    def get_stats(self, text: str, clean_text: Optional[str] = None) -> Dict[str, int]:
         """
         获取文本统计信息
+        
+        Args:
+            text: 原始文本
+            clean_text: 已提取的干净文本（调用方已有时传入，避免重复清理）
         """
-        clean_text = self.extract_clean_text(text)
+        if clean_text is None:
+            clean_text = self.extract_clean_text(text)
         
         return {
             'total_chars': len(text),
             'clean_chars': len(clean_text),
-            'chinese_chars': len(re.findall(r'[\u4e00-\u9fa5]', clean_text)),
-            'english_chars': len(re.findall(r'[a-zA-Z]', clean_text)),
-            'numbers': len(re.findall(r'\d', clean_text)),
-            'lines': len(text.split('\n')),
+            'chinese_chars': _count_chars(_CHINESE_RUN_RE, clean_text),
+            'english_chars': _count_chars(_ENGLISH_RUN_RE, clean_text),
+            'numbers': _count_chars(_DIGIT_RUN_RE, clean_text),
+            'lines': text.count('\n') + 1,
             'paragraphs': len([p for p in text.split('\n\n') if p.strip()]),
             'words': len(clean_text.split())
         }
@@ -10,7 +10,7 @@ load_dotenv()
 
 async def test():
     api_key = os.getenv("ANTHROPIC_API_KEY")
-    client = AsyncAnthropic(api_key=api_key)
+    client = AsyncAnthropic(api_key=api_key, max_retries=4)
     
     print("测试AsyncAnthropic API...")
     
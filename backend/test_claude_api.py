@@ -21,8 +21,8 @@ async def test_claude_api():
     print(f"✓ 找到API密钥: {api_key[:20]}...")
     
     try:
-        # 初始化客户端
-        client = AsyncAnthropic(api_key=api_key)
+        # 初始化客户端（限流、5xx和连接错误由SDK按指数退避重试）
+        client = AsyncAnthropic(api_key=api_key, max_retries=4)
         
         print("\n正在测试Claude API连接...")
         
@@ -1,67 +1,158 @@
 """
 正确的Claude API测试
 """
+import hashlib
+import json
 import os
+import sys
+import time
+from functools import lru_cache
+from pathlib import Path
 from anthropic import Anthropic
+from anthropic.types import Message
 from dotenv import load_dotenv
 
-# 加载环境变量
-load_dotenv()
+@lru_cache(maxsize=1)
+def _api_key() -> str:
+    """首次使用时才加载环境变量（模块导入时不读取.env），之后直接返回缓存的密钥"""
+    load_dotenv()
+    return os.getenv("ANTHROPIC_API_KEY")
 
-def test_claude():
-    api_key = os.getenv("ANTHROPIC_API_KEY")
+# 元数据生成的固定说明和JSON结构（每次调用都相同，作为可缓存的system前缀）
+METADATA_SCHEMA_PROMPT = """请为用户给出的小说生成元数据，返回JSON格式：
+
+需要生成：
+{
+    "author": "作者笔名（2-4字）",
+    "intro": "作品简介（100字左右）",
+    "firstCategory": "女频/男频",
+    "secondCategory": "二级分类",
+    "thirdCategory": "三级分类"
+}"""
+
+# 连接测试请求
+PING_PARAMS = {
+    "model": "claude-3-5-sonnet-20241022",  # 使用Claude 3.5 Sonnet模型
+    "max_tokens": 1000,
+    "messages": [
+        {
+            "role": "user",
+            "content": "请用中文回复：你好，我是Claude API测试。请确认连接正常。"
+        }
+    ]
+}
+
+# 元数据请求的固定system块（所有小说共用，可被提示缓存命中）
+METADATA_SYSTEM = [
+    {
+        "type": "text",
+        "text": METADATA_SCHEMA_PROMPT,
+        "cache_control": {"type": "ephemeral"}
+    }
+]
+
+def metadata_params(title: str, summary: str) -> dict:
+    """构造小说元数据生成请求，只有标题和内容随小说变化"""
+    return {
+        "model": "claude-3-5-sonnet-20241022",
+        "max_tokens": 2000,
+        "system": METADATA_SYSTEM,
+        "messages": [
+            {
+                "role": "user",
+                # 只有标题和内容是变化的，放在最后，前面的固定部分保持可缓存
+                "content": f"标题：{title}\n内容：{summary}"
+            }
+        ]
+    }
+
+# 小说元数据生成请求
+METADATA_PARAMS = metadata_params("霸总的意外新娘", "这是一个关于意外怀孕后与霸道总裁的爱情故事")
+
+# 元数据响应的本地缓存目录（请求内容完全相同时直接复用上次的响应）
+CACHE_DIR = Path(__file__).parent / ".cache" / "claude"
+
+def cached_create(client: Anthropic, params: dict) -> Message:
+    """
+    带本地磁盘缓存的messages.create
+    
+    以请求参数的哈希为键，命中时直接返回缓存的响应，不再调用API；
+    未命中时调用API并写入缓存（先写临时文件再替换，避免留下不完整的缓存）。
+    """
+    key = hashlib.blake2b(
+        json.dumps(params, ensure_ascii=False, sort_keys=True).encode('utf-8'),
+        digest_size=16
+    ).hexdigest()
+    cache_file = CACHE_DIR / f"{key}.json"
+    
+    if cache_file.exists():
+        print(f"💾 命中本地缓存: {cache_file.name}")
+        return Message.model_validate_json(cache_file.read_bytes())
+    
+    message = client.messages.create(**params)
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_file = cache_file.with_suffix('.tmp')
+    tmp_file.write_text(message.model_dump_json(), encoding='utf-8')
+    os.replace(tmp_file, cache_file)
+    return message
+
+# 批处理状态轮询间隔（秒）
+BATCH_POLL_INTERVAL = 5
+
+def run_batch(client: Anthropic) -> dict:
+    """
+    通过Message Batches API一次提交两个请求，等待处理结束后按custom_id返回消息
+    
+    批处理费用减半，但可能需要数分钟才能完成，只适合非交互的测试。
+    """
+    batch = client.messages.batches.create(requests=[
+        {"custom_id": "ping", "params": PING_PARAMS},
+        {"custom_id": "meta", "params": METADATA_PARAMS},
+    ])
+    print(f"📦 批处理已提交: {batch.id}")
+    
+    while batch.processing_status != "ended":
+        time.sleep(BATCH_POLL_INTERVAL)
+        batch = client.messages.batches.retrieve(batch.id)
+    
+    messages = {}
+    for entry in client.messages.batches.results(batch.id):
+        if entry.result.type != "succeeded":
+            raise RuntimeError(f"批处理请求 {entry.custom_id} 失败: {entry.result.type}")
+        messages[entry.custom_id] = entry.result.message
+    return messages
+
+def test_claude(batch: bool = False):
+    api_key = _api_key()
     print(f"🔑 API Key: {api_key[:30]}...")
     
     try:
-        # 使用messages API (新版本)
-        client = Anthropic(api_key=api_key)
+        # 使用messages API (新版本)；限流、5xx和连接错误由SDK按指数退避重试，只重发失败的那次请求
+        client = Anthropic(api_key=api_key, max_retries=4)
         
-        print("\n📤 发送测试请求...")
-        
-        # 使用messages.create方法
-        message = client.messages.create(
-            model="claude-3-5-sonnet-20241022",  # 使用Claude 3.5 Sonnet模型
-            max_tokens=1000,
-            messages=[
-                {
-                    "role": "user",
-                    "content": "请用中文回复：你好，我是Claude API测试。请确认连接正常。"
-                }
-            ]
-        )
+        if batch:
+            print("\n📤 以批处理方式发送测试请求...")
+            messages = run_batch(client)
+            ping, metadata = messages["ping"], messages["meta"]
+        else:
+            print("\n📤 发送测试请求...")
+            ping = client.messages.create(**PING_PARAMS)
+            metadata = None
         
         print(f"\n✅ API连接成功!")
-        print(f"📥 响应: {message.content[0].text}")
+        print(f"📥 响应: {ping.content[0].text}")
         
         # 测试生成小说元数据
         print("\n\n📚 测试生成小说元数据...")
-        message = client.messages.create(
-            model="claude-3-5-sonnet-20241022",
-            max_tokens=2000,
-            messages=[
-                {
-                    "role": "user",
-                    "content": """
-                    请为以下小说生成元数据，返回JSON格式：
-                    
-                    标题：霸总的意外新娘
-                    内容：这是一个关于意外怀孕后与霸道总裁的爱情故事
-                    
-                    需要生成：
-                    {
-                        "author": "作者笔名（2-4字）",
-                        "intro": "作品简介（100字左右）",
-                        "firstCategory": "女频/男频",
-                        "secondCategory": "二级分类",
-                        "thirdCategory": "三级分类"
-                    }
-                    """
-                }
-            ]
-        )
+        if metadata is None:
+            metadata = cached_create(client, METADATA_PARAMS)
+        
+        usage = metadata.usage
+        print(f"📊 缓存写入: {getattr(usage, 'cache_creation_input_tokens', 0)} tokens, "
+              f"缓存命中: {getattr(usage, 'cache_read_input_tokens', 0)} tokens")
         
         print(f"✅ 元数据生成成功:")
-        print(message.content[0].text)
+        print(metadata.content[0].text)
         
         return True
         
@@ -88,7 +179,8 @@ if __name__ == "__main__":
     print("Claude API 测试")
     print("="*50)
     
-    if test_claude():
+    # --batch: 通过Message Batches API提交（更便宜，但需要等待处理完成）
+    if test_claude(batch="--batch" in sys.argv[1:]):
         print("\n🎉 所有测试通过！Claude API工作正常！")
     else:
         print("\n⚠️ 测试失败，请检查配置")
@@ -1,29 +1,41 @@
 """
 简单测试Claude API
 """
+import atexit
 import os
+from functools import lru_cache
 from anthropic import Anthropic
 from dotenv import load_dotenv
 
-# 加载环境变量
-load_dotenv()
+@lru_cache(maxsize=1)
+def _api_key() -> str:
+    """首次使用时才加载环境变量（模块导入时不读取.env），之后直接返回缓存的密钥"""
+    load_dotenv()
+    return os.getenv("ANTHROPIC_API_KEY")
+
+@lru_cache(maxsize=1)
+def _client() -> Anthropic:
+    """
+    进程内共享的客户端，多次调用复用同一个连接池，退出时关闭；
+    限流、5xx和连接错误由SDK按指数退避重试
+    """
+    client = Anthropic(api_key=_api_key(), max_retries=4)
+    atexit.register(client.close)
+    return client
 
 def test_claude():
-    api_key = os.getenv("ANTHROPIC_API_KEY")
+    api_key = _api_key()
     print(f"API Key: {api_key[:30]}...")
     
     try:
-        # 使用同步客户端测试
-        client = Anthropic(api_key=api_key)
-        
         # 测试简单请求
-        response = client.completions.create(
-            model="claude-instant-1.2",
-            prompt="\n\nHuman: Say 'Hello World'\n\nAssistant:",
-            max_tokens_to_sample=100
+        response = _client().messages.create(
+            model="claude-3-5-haiku-20241022",
+            max_tokens=100,
+            messages=[{"role": "user", "content": "Say 'Hello World'"}]
         )
         
-        print(f"Response: {response.completion}")
+        print(f"Response: {response.content[0].text}")
         return True
         
     except Exception as e:
@@ -2,13 +2,113 @@
 """
 测试完整的小说处理工作流
 """
+import aiofiles
 import httpx
 import asyncio
 import json
+import orjson
+import os
+import sys
+from operator import itemgetter
+from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import AsyncIterator, Optional
+from tenacity import (
+    retry, retry_if_exception_type, retry_if_result, stop_after_attempt, wait_exponential_jitter
+)
 
-async def test_full_workflow():
-    """测试完整流程：上传 -> 解析 -> Claude生成 -> 预览"""
+BASE_URL = "http://localhost:8000"
+
+# 连接池配置：各步骤复用保持的连接，不重复建立TCP连接
+CLIENT_LIMITS = httpx.Limits(max_keepalive_connections=20, max_connections=50, keepalive_expiry=30.0)
+
+def make_client() -> httpx.AsyncClient:
+    """创建测试用的客户端（多次运行测试时可创建一次后传入，复用同一个连接池）"""
+    return httpx.AsyncClient(base_url=BASE_URL, timeout=60.0, limits=CLIENT_LIMITS)
+
+@asynccontextmanager
+async def _client_scope(client: Optional[httpx.AsyncClient]) -> AsyncIterator[httpx.AsyncClient]:
+    """使用调用方传入的客户端（不负责关闭），未传入时临时创建一个"""
+    if client is not None:
+        yield client
+        return
+    async with make_client() as client:
+        yield client
+
+# 限流或网关暂时不可用时可以安全重试的状态码
+RETRY_STATUS_CODES = frozenset({429, 502, 503, 504})
+
+# 只重试失败的那一次请求，不必从头重跑整个流程（已生成的元数据不会白白浪费）
+retry_request = retry(
+    retry=retry_if_exception_type(httpx.TransportError)
+    | retry_if_result(lambda response: response.status_code in RETRY_STATUS_CODES),
+    wait=wait_exponential_jitter(initial=1, max=16),
+    stop=stop_after_attempt(4),
+    reraise=True,
+    retry_error_callback=lambda state: state.outcome.result()
+)
+
+JSON_HEADERS = {'Content-Type': 'application/json'}
+
+@retry_request
+async def get(client: httpx.AsyncClient, url: str) -> httpx.Response:
+    """发送GET请求（失败时按退避策略重试）"""
+    return await client.get(url)
+
+@retry_request
+async def post_json(client: httpx.AsyncClient, url: str, data: dict) -> httpx.Response:
+    """用orjson序列化请求体后发送（直接得到UTF-8字节，不经过标准库json和二次编码）"""
+    return await client.post(url, content=orjson.dumps(data), headers=JSON_HEADERS)
+
+# 上传时每次从磁盘读取的块大小（与服务端分块写入的1MB一致，减少read调用次数）
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+def multipart_upload(path: Path, content_type: str = 'text/markdown') -> tuple:
+    """
+    构造流式上传的multipart请求体
+    
+    文件内容按块从磁盘异步读取后直接发送，内存占用与文件大小无关；
+    Content-Length由头尾分隔部分和文件大小预先算出。
+    
+    Returns:
+        (请求头, 异步字节流)
+    """
+    boundary = os.urandom(16).hex()
+    filename = path.name.replace('"', '%22')
+    head = (
+        f'--{boundary}\r\n'
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f'Content-Type: {content_type}\r\n\r\n'
+    ).encode('utf-8')
+    tail = f'\r\n--{boundary}--\r\n'.encode('ascii')
+    
+    async def body() -> AsyncIterator[bytes]:
+        yield head
+        async with aiofiles.open(path, 'rb') as f:
+            while chunk := await f.read(UPLOAD_CHUNK_SIZE):
+                yield chunk
+        yield tail
+    
+    headers = {
+        'Content-Type': f'multipart/form-data; boundary={boundary}',
+        'Content-Length': str(len(head) + path.stat().st_size + len(tail)),
+    }
+    return headers, body()
+
+@retry_request
+async def upload_file(client: httpx.AsyncClient, url: str, path: Path) -> httpx.Response:
+    """流式上传文件（每次重试重新构造请求体，从文件开头重新读取）"""
+    headers, body = multipart_upload(path)
+    return await client.post(url, content=body, headers=headers)
+
+async def test_full_workflow(client: Optional[httpx.AsyncClient] = None, regenerate: bool = False):
+    """
+    测试完整流程：上传 -> 解析 -> Claude生成 -> 预览
+    
+    Args:
+        client: 复用的客户端（可选）
+        regenerate: 是否额外测试重新生成精彩片段（会再调用一次Claude）
+    """
     
     print("="*50)
     print("📚 小说发布系统完整工作流测试")
@@ -21,12 +121,10 @@ async def test_full_workflow():
         print(f"❌ 文件不存在: {novel_file}")
         return
     
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        base_url = "http://localhost:8000"
-        
+    async with _client_scope(client) as client:
         # 1. 测试健康检查
         print("\n1️⃣ 测试健康检查...")
-        response = await client.get(f"{base_url}/api/novel/health")
+        response = await get(client, "/api/novel/health")
         if response.status_code == 200:
             print(f"✅ 服务器状态: {response.json()}")
         else:
@@ -35,9 +133,7 @@ async def test_full_workflow():
         
         # 2. 测试文件上传
         print("\n2️⃣ 测试文件上传...")
-        with open(novel_file, 'rb') as f:
-            files = {'file': (novel_file.name, f, 'text/markdown')}
-            response = await client.post(f"{base_url}/api/novel/upload", files=files)
+        response = await upload_file(client, "/api/novel/upload", novel_file)
         
         if response.status_code == 200:
             upload_result = response.json()
@@ -58,10 +154,12 @@ async def test_full_workflow():
             }
         }
         
-        response = await client.post(f"{base_url}/api/novel/parse", json=parse_data)
+        # 解析结果整体读取：服务端一次性编码好整个响应体再发送，
+        # 后续保存步骤也需要完整的novel_data，逐章流式解析没有收益
+        response = await post_json(client, "/api/novel/parse", parse_data)
         
         if response.status_code == 200:
-            novel_data = response.json()
+            novel_data = orjson.loads(response.content)
             print(f"✅ 解析成功！")
             print(f"\n📖 基本信息:")
             print(f"  标题: {novel_data['title']}")
@@ -70,8 +168,8 @@ async def test_full_workflow():
             print(f"  状态: {'完结' if novel_data['completeStatus'] == 2 else '连载'}")
             print(f"  章节数: {len(novel_data['chapterList'])}")
             
-            # 统计字数
-            total_words = sum(len(ch['chapterContent']) for ch in novel_data['chapterList'])
+            # 统计字数（map在C层逐章取内容并求长度，不经过生成器）
+            total_words = sum(map(len, map(itemgetter('content'), novel_data['chapterList'])))
             print(f"  总字数: {total_words:,}")
             
             print(f"\n📝 简介 (前100字):")
@@ -83,7 +181,7 @@ async def test_full_workflow():
             # 显示前3章信息
             print(f"\n📚 章节列表 (前3章):")
             for i, chapter in enumerate(novel_data['chapterList'][:3], 1):
-                print(f"  第{i}章: {chapter['chapterTitle']} ({len(chapter['chapterContent'])}字)")
+                print(f"  第{i}章: {chapter['chapterTitle']} ({len(chapter['content'])}字)")
             
             # 检查是否使用了Claude API
             if novel_data['author'] != "默认作者" and "暂无" not in novel_data['intro']:
@@ -96,26 +194,27 @@ async def test_full_workflow():
             print(response.text)
             return
         
-        # 4. 测试重新生成功能
-        print("\n4️⃣ 测试重新生成精彩片段...")
-        regenerate_data = {
-            "chapters": novel_data['chapterList'][:3],
-            "minLength": 400,
-            "maxLength": 1000
-        }
-        
-        response = await client.post(f"{base_url}/api/novel/generate-paragraph", json=regenerate_data)
-        
-        if response.status_code == 200:
-            result = response.json()
-            print(f"✅ 重新生成成功!")
-            print(f"  新片段 (前200字): {result['awesomeParagraph'][:200]}...")
+        # 4. 解析时已生成精彩片段，直接检查长度；只有指定 --regenerate 时才再调用一次Claude重新生成
+        min_length, max_length = 400, 1000
+        paragraph_length = len(novel_data['awesomeParagraph'])
+        if min_length <= paragraph_length <= max_length:
+            print(f"\n4️⃣ 精彩片段长度符合要求: {paragraph_length}字")
         else:
-            print(f"⚠️ 重新生成失败 (可能未配置Claude API)")
+            print(f"\n4️⃣ ⚠️ 精彩片段长度不在{min_length}-{max_length}字之间: {paragraph_length}字")
+        
+        pending = []
+        if regenerate:
+            print("\n4️⃣ 测试重新生成精彩片段...")
+            regenerate_data = {
+                "chapters": novel_data['chapterList'][:3],
+                "minLength": min_length,
+                "maxLength": max_length
+            }
+            pending.append(post_json(client, "/api/novel/generate-paragraph", regenerate_data))
         
-        # 5. 测试保存功能
+        # 5. 测试保存功能（与重新生成互不依赖，并发发送）
         print("\n5️⃣ 测试保存修改...")
-        # 修改一些数据
+        # 修改一些数据（重新生成只用到章节列表，不受影响）
         novel_data['author'] = "测试作者"
         novel_data['intro'] = "这是修改后的简介，用于测试保存功能。"
         
@@ -123,15 +222,24 @@ async def test_full_workflow():
             "filePath": file_path,
             "data": novel_data
         }
+        pending.append(post_json(client, "/api/novel/save", save_data))
         
-        response = await client.post(f"{base_url}/api/novel/save", json=save_data)
+        *regenerate_responses, save_response = await asyncio.gather(*pending)
         
-        if response.status_code == 200:
-            save_result = response.json()
+        for regenerate_response in regenerate_responses:
+            if regenerate_response.status_code == 200:
+                result = orjson.loads(regenerate_response.content)
+                print(f"✅ 重新生成成功!")
+                print(f"  新片段 (前200字): {result['awesomeParagraph'][:200]}...")
+            else:
+                print(f"⚠️ 重新生成失败 (可能未配置Claude API)")
+        
+        if save_response.status_code == 200:
+            save_result = orjson.loads(save_response.content)
             print(f"✅ 保存成功!")
             print(f"  备份文件: {save_result['backupPath']}")
         else:
-            print(f"❌ 保存失败: {response.status_code}")
+            print(f"❌ 保存失败: {save_response.status_code}")
         
         # 6. 总结
         print("\n" + "="*50)
@@ -148,4 +256,5 @@ async def test_full_workflow():
         print("="*50)
 
 if __name__ == "__main__":
-    asyncio.run(test_full_workflow())
\ No newline at end of file
+    # --regenerate: 额外测试重新生成精彩片段
+    asyncio.run(test_full_workflow(regenerate="--regenerate" in sys.argv[1:]))
\ No newline at end of file
@@ -0,0 +1,38 @@
+"""
+测试Markdown清理（嵌套标记的回归用例，不需要启动后端服务）
+"""
+from services.text_strip_service import TextStripService
+
+# (输入, 期望输出)
+NESTED_CASES = [
+    ("**[link](url)**", "link"),
+    ("[**bold**](url)", "bold"),
+    ("`**x**`", "x"),
+    ("> - item", "item"),
+    ("# > x", "x"),
+]
+
+PLAIN_CASES = [
+    ("# 标题\n**粗体**文本\n- 列表项\n[链接](http://example.com)", "标题 粗体文本 列表项 链接"),
+    ("![alt](http://example.com/a.png)", "!alt"),
+    ("```\nprint('x')\n```正文", "正文"),
+    ("普通文本，没有任何标记。", "普通文本，没有任何标记。"),
+]
+
+service = TextStripService()
+
+def test_strip_nested_markdown():
+    """嵌套的标记应逐层剥离，与逐项清理的结果一致"""
+    for text, expected in NESTED_CASES:
+        assert service.strip_markdown(text) == expected, text
+
+def test_strip_plain_markdown():
+    """常见的单层标记"""
+    for text, expected in PLAIN_CASES:
+        assert service.strip_markdown(text) == expected, text
+
+if __name__ == "__main__":
+    for text, expected in NESTED_CASES + PLAIN_CASES:
+        result = service.strip_markdown(text)
+        status = "通过" if result == expected else "失败"
+        print(f"[{status}] {text!r} -> {result!r}")
@@ -34,6 +34,20 @@ get_lan_ip() {
     fi
 }
 
+# 生成后端允许的CORS来源（JSON数组，供pydantic-settings解析）
+# 包含本机和局域网IP的前端/后端地址；环境变量或backend/.env中已设置CORS_ORIGINS时保持不变
+export_cors_origins() {
+    if [ -n "$CORS_ORIGINS" ] || grep -qi '^CORS_ORIGINS=' "$SCRIPT_PATH/backend/.env" 2>/dev/null; then
+        return 0
+    fi
+    local origins='"http://localhost:3838","http://127.0.0.1:3838","http://localhost:8038","http://127.0.0.1:8038"'
+    local lan_ip=$(get_lan_ip)
+    if [ -n "$lan_ip" ]; then
+        origins="$origins,\"http://$lan_ip:3838\",\"http://$lan_ip:8038\""
+    fi
+    export CORS_ORIGINS="[$origins]"
+}
+
 # 检查服务是否运行
 is_running() {
     local pid_file=$1
@@ -73,6 +87,9 @@ start_backend() {
     # 创建必要的目录
     mkdir -p data/novels data/backups uploads static
     
+    # 允许局域网地址跨域访问后端
+    export_cors_origins
+    
     # 后台启动后端
     nohup env PORT=8038 python main.py > "$BACKEND_LOG" 2>&1 &
     local pid=$!